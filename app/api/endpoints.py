@@ -1,83 +1,153 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import asyncpg
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.models.db import get_db, FAQEntry, QueryLog
+from typing import Optional
+from app.models.db import get_db, FAQEntry, QueryLog, SessionLocal
+from app.core.db_pool import get_db_pool
 from app.models.schemas import (
-    QuestionRequest, QuestionResponse, FAQEntryCreate, 
-    FAQEntryResponse, EmbeddingStats
+    QuestionRequest, QuestionResponse, BatchQuestionRequest, BatchQuestionResponse, FAQEntryCreate, 
+    FAQEntryResponse, FAQEntryPage, EmbeddingStats
 )
 
-from app.services.similarity_service import SimilarityService
-from app.services.openai_service import OpenAIService
-from app.services.embeddings_service import compute_embeddings_for_collection, update_embeddings_incremental, EmbeddingService
+from app.services.similarity_service import SimilarityService, get_similarity_service
+from app.services.openai_service import OpenAIService, UNAVAILABLE_ANSWER, get_openai_service
+from app.services.cache import AnswerCache, get_response_cache
+from app.services.embeddings_service import compute_embeddings_for_collection, update_embeddings_incremental, EmbeddingService, get_embedding_service
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _write_query_log(**fields):
+    db = SessionLocal()
+    try:
+        db.add(QueryLog(**fields))
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error writing query log: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def _local_response(faq_entry: FAQEntry, similarity_score: float) -> QuestionResponse:
+    return QuestionResponse(
+        source="local",
+        matched_question=faq_entry.question,
+        answer=faq_entry.answer,
+        similarity_score=similarity_score
+    )
+
+def _openai_response(answer: str) -> QuestionResponse:
+    return QuestionResponse(
+        source="openai",
+        matched_question=None,
+        answer=answer
+    )
+
+def _remember_response(response_cache: AnswerCache, user_question: str, response: QuestionResponse):
+    # A failed LLM call is not an answer; let the next request retry it.
+    if response.answer != UNAVAILABLE_ANSWER:
+        response_cache.set(user_question, response)
+
+def _log_query(background_tasks: BackgroundTasks, user_question: str, response: QuestionResponse):
+    background_tasks.add_task(
+        _write_query_log,
+        user_question=user_question,
+        matched_question=response.matched_question,
+        answer=response.answer,
+        source=response.source,
+        similarity_score=response.similarity_score
+    )
+
 @router.post("/ask-question", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    pool: asyncpg.Pool = Depends(get_db_pool),
+    similarity_service: SimilarityService = Depends(get_similarity_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    response_cache: AnswerCache = Depends(get_response_cache),
 ):
     try:
-        similarity_service = SimilarityService()
-        openai_service = OpenAIService()
+        response = response_cache.get(request.user_question)
         
-        similar_entry = await similarity_service.find_most_similar(
-            request.user_question, db
-        )
- 
-        if similar_entry:
-            faq_entry, similarity_score = similar_entry
-            response = QuestionResponse(
-                source="local",
-                matched_question=faq_entry.question,
-                answer=faq_entry.answer,
-                similarity_score=similarity_score
+        if response is None:
+            similar_entry = await similarity_service.find_most_similar(
+                request.user_question, pool
             )
             
+            if similar_entry:
+                response = _local_response(*similar_entry)
+            else:
+                response = _openai_response(await openai_service.get_answer(request.user_question))
             
-            log_entry = QueryLog(
-                user_question=request.user_question,
-                matched_question=faq_entry.question,
-                answer=faq_entry.answer,
-                source="local",
-                similarity_score=similarity_score
-            )
-            db.add(log_entry)
-            db.commit()
-            
-            return response
+            _remember_response(response_cache, request.user_question, response)
         
-        openai_answer = await openai_service.get_answer(request.user_question)
+        _log_query(background_tasks, request.user_question, response)
+        return response
         
-        response = QuestionResponse(
-            source="openai",
-            matched_question=None,
-            answer=openai_answer
+    except Exception as e:
+        logger.error(f"Error processing question: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
         )
         
-        log_entry = QueryLog(
-            user_question=request.user_question,
-            answer=openai_answer,
-            source="openai"
-        )
-        db.add(log_entry)
-        db.commit()
+@router.post("/ask/batch", response_model=BatchQuestionResponse)
+async def ask_questions_batch(
+    request: BatchQuestionRequest,
+    background_tasks: BackgroundTasks,
+    pool: asyncpg.Pool = Depends(get_db_pool),
+    similarity_service: SimilarityService = Depends(get_similarity_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    response_cache: AnswerCache = Depends(get_response_cache),
+):
+    try:
+        responses = {
+            question: response_cache.get(question)
+            for question in dict.fromkeys(request.user_questions)
+        }
+        to_ask = [question for question, response in responses.items() if response is None]
         
-        return response
+        if to_ask:
+            similar_entries = await similarity_service.find_most_similar_batch(to_ask, pool)
+            
+            unmatched = [
+                question for question, similar_entry in zip(to_ask, similar_entries)
+                if similar_entry is None
+            ]
+            openai_answers = await asyncio.gather(
+                *(openai_service.get_answer(question) for question in unmatched)
+            )
+            
+            for question, similar_entry in zip(to_ask, similar_entries):
+                if similar_entry:
+                    responses[question] = _local_response(*similar_entry)
+            for question, openai_answer in zip(unmatched, openai_answers):
+                responses[question] = _openai_response(openai_answer)
+            for question in to_ask:
+                _remember_response(response_cache, question, responses[question])
+        
+        results = []
+        for user_question in request.user_questions:
+            _log_query(background_tasks, user_question, responses[user_question])
+            results.append(responses[user_question])
+        
+        return BatchQuestionResponse(results=results)
         
     except Exception as e:
-        logger.error(f"Error processing question: {e}")
+        logger.error(f"Error processing question batch: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
         
 @router.post("/embeddings")
-async def compute_embeddings(
+def compute_embeddings(
     collection: str = "default",
 ):
     try:
@@ -92,7 +162,7 @@ async def compute_embeddings(
 
 
 @router.post("/faq-entries", response_model=FAQEntryResponse)
-async def create_faq_entry(
+def create_faq_entry(
     entry: FAQEntryCreate,
     db: Session = Depends(get_db),
 ):
@@ -106,6 +176,12 @@ async def create_faq_entry(
         
         return db_entry
         
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="FAQ entry already exists in this collection"
+        )
     except Exception as e:
         logger.error(f"Error creating FAQ entry: {e}")
         raise HTTPException(
@@ -113,27 +189,32 @@ async def create_faq_entry(
             detail="Error creating FAQ entry"
         )
 
-@router.get("/faq-entries", response_model=List[FAQEntryResponse])
-async def get_faq_entries(
+@router.get("/faq-entries", response_model=FAQEntryPage)
+def get_faq_entries(
     collection: Optional[str] = "default",
-    skip: int = 0,
-    limit: int = 100,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
-    query = db.query(FAQEntry)
+    query = db.query(FAQEntry).filter(FAQEntry.id > after_id)
     if collection:
         query = query.filter(FAQEntry.collection == collection)
-    return query.offset(skip).limit(limit).all()
+    entries = query.order_by(FAQEntry.id).limit(limit).all()
+    
+    next_after_id = entries[-1].id if len(entries) == limit else None
+    return FAQEntryPage(items=entries, next_after_id=next_after_id)
 
 
 @router.get("/embeddings/stats", response_model=EmbeddingStats)
-async def get_embedding_stats(
+def get_embedding_stats(
     db: Session = Depends(get_db),
 ):
     try:
-        total_entries = db.query(FAQEntry).count()
-        collections = db.query(FAQEntry.collection).distinct().all()
-        collections = [c[0] for c in collections]
+        collection_counts = db.query(
+            FAQEntry.collection, func.count(FAQEntry.id)
+        ).group_by(FAQEntry.collection).all()
+        total_entries = sum(count for _, count in collection_counts)
+        collections = [collection for collection, _ in collection_counts]
         
         return EmbeddingStats(
             total_entries=total_entries,
@@ -151,10 +232,11 @@ async def health_check():
     return {"status": "healthy"}
 
 @router.get("/rate-limits")
-async def get_rate_limits():
+async def get_rate_limits(
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+):
    
     try:
-        embedding_service = EmbeddingService()
         status = embedding_service.get_rate_limit_status()
         
         return {
@@ -171,10 +253,22 @@ async def get_rate_limits():
             "message": str(e)
         }
 
+@router.get("/cache/stats")
+async def get_cache_stats(
+    similarity_service: SimilarityService = Depends(get_similarity_service),
+    response_cache: AnswerCache = Depends(get_response_cache),
+):
+    return {
+        "status": "success",
+        "responses": response_cache.stats(),
+        "semantic_caches": similarity_service.get_cache_stats()
+    }
+
 @router.post("/test-openai")
-async def test_openai_connection():
+async def test_openai_connection(
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+):
     try:
-        embedding_service = EmbeddingService()
         result = await embedding_service.test_connection()
         return result
         
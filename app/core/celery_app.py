@@ -1,6 +1,17 @@
+import orjson
 from celery import Celery
+from kombu import Queue
+from kombu.serialization import register
 from app.core.settings import settings
 
+register(
+    "orjson",
+    lambda obj: orjson.dumps(obj).decode("utf-8"),
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8",
+)
+
 celery_app = Celery(
     "semantic_faq_assistant",
     broker=settings.celery_broker_url,
@@ -9,14 +20,26 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="orjson",
+    accept_content=["orjson", "json"],
+    result_serializer="orjson",
+    task_ignore_result=True,
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
     task_time_limit=30 * 60, 
     task_soft_time_limit=25 * 60, 
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-)
\ No newline at end of file
+    task_default_queue="celery",
+    task_queues=(
+        Queue("celery", routing_key="celery"),
+        # A separate queue lets embedding work be scaled on its own workers.
+        Queue("embeddings", routing_key="embeddings"),
+    ),
+    task_routes={
+        "app.services.embeddings_service.*": {"queue": "embeddings"},
+    },
+)
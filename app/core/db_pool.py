@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+from pgvector.asyncpg import register_vector
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+def _asyncpg_dsn(database_url: str) -> str:
+    # asyncpg takes a plain libpq URL, without SQLAlchemy's "+driver" suffix.
+    scheme, sep, rest = database_url.partition("://")
+    return f"{scheme.split('+')[0]}{sep}{rest}"
+
+
+async def get_db_pool() -> asyncpg.Pool:
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    dsn=_asyncpg_dsn(settings.database_url),
+                    min_size=settings.db_async_pool_min_size,
+                    max_size=settings.db_async_pool_max_size,
+                    max_queries=50000,
+                    max_inactive_connection_lifetime=300,
+                    # Send vector/halfvec parameters in pgvector's binary format.
+                    init=register_vector,
+                )
+                logger.info("Created asyncpg connection pool")
+    return _pool
+
+
+async def close_db_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Closed asyncpg connection pool")
+
+
+
+def acquire_connection(pool: asyncpg.Pool):
+    """
+    Check out a pooled connection, failing after a timeout rather than
+    queueing forever when the pool is exhausted.
+    """
+    return pool.acquire(timeout=settings.db_async_pool_acquire_timeout)
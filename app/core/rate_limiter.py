@@ -1,6 +1,6 @@
 import time
 import asyncio
-from typing import Dict, List
+from typing import Dict
 from datetime import datetime, timedelta
 import logging
 
@@ -21,120 +21,106 @@ class OpenAIRateLimiter:
         self.tpm_limit = tpm_limit
         self.tpd_limit = tpd_limit
         
-        self.requests_minute: List[float] = []
-        self.requests_day: List[float] = []
-        self.tokens_minute: List[tuple] = [] 
-        self.tokens_day: List[tuple] = []     
-        
-        self._lock = asyncio.Lock()
+        # Fixed one-minute and one-day windows. acquire() never awaits between
+        # checking and updating these counters, so no lock is needed on the
+        # event loop.
+        now = time.time()
+        self._minute_start = now
+        self._day_start = now
+        self._rpm_count = 0
+        self._rpd_count = 0
+        self._tpm_count = 0
+        self._tpd_count = 0
     
     async def acquire(self, estimated_tokens: int = 100):
 
-        async with self._lock:
+        while True:
             now = time.time()
-            self._cleanup_old_entries(now)
+            self._roll_windows(now)
         
             wait_time = self._calculate_wait_time(now, estimated_tokens)
+            if wait_time <= 0:
+                break
             
-            if wait_time > 0:
-                logger.warning(f"Rate limit protection: waiting {wait_time:.2f} seconds...")
-                await asyncio.sleep(wait_time)
-            
-                now = time.time()
-                self._cleanup_old_entries(now)
-            
+            logger.warning(f"Rate limit protection: waiting {wait_time:.2f} seconds...")
+            await asyncio.sleep(wait_time)
        
-            self._record_request(now, estimated_tokens)
-            status = self._get_current_status(now)
-            logger.debug(f"Rate limiter status: {status}")
+        self._record_request(estimated_tokens)
+        logger.debug(f"Rate limiter status: {self._get_current_status()}")
 
-    def _cleanup_old_entries(self, now: float):
+    def _roll_windows(self, now: float):
   
-        minute_ago = now - 60
-        day_ago = now - (24 * 60 * 60)
-   
-        self.requests_minute = [t for t in self.requests_minute if t > minute_ago]
-        self.tokens_minute = [(t, tokens) for t, tokens in self.tokens_minute if t > minute_ago]
+        if now - self._minute_start >= 60:
+            self._minute_start = now
+            self._rpm_count = 0
+            self._tpm_count = 0
        
-        self.requests_day = [t for t in self.requests_day if t > day_ago]
-        self.tokens_day = [(t, tokens) for t, tokens in self.tokens_day if t > day_ago]
+        if now - self._day_start >= 24 * 60 * 60:
+            self._day_start = now
+            self._rpd_count = 0
+            self._tpd_count = 0
 
     def _calculate_wait_time(self, now: float, estimated_tokens: int) -> float:
       
         wait_times = []
+        minute_reset = 60 - (now - self._minute_start)
+        day_reset = (24 * 60 * 60) - (now - self._day_start)
      
-        if len(self.requests_minute) >= self.rpm_limit:
-            oldest_request = min(self.requests_minute)
-            rpm_wait = 60 - (now - oldest_request) + 1
-            wait_times.append(rpm_wait)
-            logger.debug(f"RPM limit check: {len(self.requests_minute)}/{self.rpm_limit}, wait: {rpm_wait:.2f}s")
+        if self._rpm_count >= self.rpm_limit:
+            wait_times.append(minute_reset)
+            logger.debug(f"RPM limit check: {self._rpm_count}/{self.rpm_limit}, wait: {minute_reset:.2f}s")
     
-        if len(self.requests_day) >= self.rpd_limit:
-            oldest_request = min(self.requests_day)
-            rpd_wait = (24 * 60 * 60) - (now - oldest_request) + 1
-            wait_times.append(rpd_wait)
-            logger.debug(f"RPD limit check: {len(self.requests_day)}/{self.rpd_limit}, wait: {rpd_wait:.2f}s")
+        if self._rpd_count >= self.rpd_limit:
+            wait_times.append(day_reset)
+            logger.debug(f"RPD limit check: {self._rpd_count}/{self.rpd_limit}, wait: {day_reset:.2f}s")
         
+        # A request larger than the whole budget is let through once the window is empty.
+        if self._tpm_count and self._tpm_count + estimated_tokens > self.tpm_limit:
+            wait_times.append(minute_reset)
+            logger.debug(f"TPM limit check: {self._tpm_count + estimated_tokens}/{self.tpm_limit}, wait: {minute_reset:.2f}s")
         
-        current_tokens_minute = sum(tokens for _, tokens in self.tokens_minute)
-        if current_tokens_minute + estimated_tokens > self.tpm_limit:
-            if self.tokens_minute:
-                oldest_token_request = min(t for t, _ in self.tokens_minute)
-                tpm_wait = 60 - (now - oldest_token_request) + 1
-                wait_times.append(tpm_wait)
-                logger.debug(f"TPM limit check: {current_tokens_minute + estimated_tokens}/{self.tpm_limit}, wait: {tpm_wait:.2f}s")
-        
-     
-        current_tokens_day = sum(tokens for _, tokens in self.tokens_day)
-        if current_tokens_day + estimated_tokens > self.tpd_limit:
-            if self.tokens_day:
-                oldest_token_request = min(t for t, _ in self.tokens_day)
-                tpd_wait = (24 * 60 * 60) - (now - oldest_token_request) + 1
-                wait_times.append(tpd_wait)
-                logger.debug(f"TPD limit check: {current_tokens_day + estimated_tokens}/{self.tpd_limit}, wait: {tpd_wait:.2f}s")
+        if self._tpd_count and self._tpd_count + estimated_tokens > self.tpd_limit:
+            wait_times.append(day_reset)
+            logger.debug(f"TPD limit check: {self._tpd_count + estimated_tokens}/{self.tpd_limit}, wait: {day_reset:.2f}s")
         
         return max(wait_times) if wait_times else 0
 
-    def _record_request(self, now: float, tokens_used: int):
+    def _record_request(self, tokens_used: int):
      
-        self.requests_minute.append(now)
-        self.requests_day.append(now)
-        self.tokens_minute.append((now, tokens_used))
-        self.tokens_day.append((now, tokens_used))
+        self._rpm_count += 1
+        self._rpd_count += 1
+        self._tpm_count += tokens_used
+        self._tpd_count += tokens_used
 
-    def _get_current_status(self, now: float) -> Dict:
-        
-        current_tokens_minute = sum(tokens for _, tokens in self.tokens_minute)
-        current_tokens_day = sum(tokens for _, tokens in self.tokens_day)
+    def _get_current_status(self) -> Dict:
         
         return {
             "rpm": {
-                "current": len(self.requests_minute),
+                "current": self._rpm_count,
                 "limit": self.rpm_limit,
-                "remaining": max(0, self.rpm_limit - len(self.requests_minute))
+                "remaining": max(0, self.rpm_limit - self._rpm_count)
             },
             "rpd": {
-                "current": len(self.requests_day),
+                "current": self._rpd_count,
                 "limit": self.rpd_limit,
-                "remaining": max(0, self.rpd_limit - len(self.requests_day))
+                "remaining": max(0, self.rpd_limit - self._rpd_count)
             },
             "tpm": {
-                "current": current_tokens_minute,
+                "current": self._tpm_count,
                 "limit": self.tpm_limit,
-                "remaining": max(0, self.tpm_limit - current_tokens_minute)
+                "remaining": max(0, self.tpm_limit - self._tpm_count)
             },
             "tpd": {
-                "current": current_tokens_day,
+                "current": self._tpd_count,
                 "limit": self.tpd_limit,
-                "remaining": max(0, self.tpd_limit - current_tokens_day)
+                "remaining": max(0, self.tpd_limit - self._tpd_count)
             }
         }
 
     def get_status(self) -> Dict:
         
-        now = time.time()
-        self._cleanup_old_entries(now)
-        return self._get_current_status(now)
+        self._roll_windows(time.time())
+        return self._get_current_status()
 
     def update_limits(self, rpm: int = None, rpd: int = None, tpm: int = None, tpd: int = None):
      
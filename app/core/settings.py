@@ -14,6 +14,9 @@ class Settings(BaseSettings):
     postgres_db: str = os.getenv("POSTGRES_DB", "semantic_faq")
     db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "20"))
     db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_async_pool_min_size: int = int(os.getenv("DB_ASYNC_POOL_MIN_SIZE", "10"))
+    db_async_pool_max_size: int = int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "50"))
+    db_async_pool_acquire_timeout: float = float(os.getenv("DB_ASYNC_POOL_ACQUIRE_TIMEOUT", "5"))
     
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     celery_broker_url: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
@@ -27,12 +30,20 @@ class Settings(BaseSettings):
     cors_origins: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:8000")
     
     similarity_threshold: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+    hnsw_ef_search: int = int(os.getenv("HNSW_EF_SEARCH", "100"))
+    # 0 searches the halfvec index directly; N > 0 takes N candidates by Hamming
+    # distance over binary-quantized embeddings and reranks them exactly.
+    binary_rerank_candidates: int = int(os.getenv("BINARY_RERANK_CANDIDATES", "0"))
     openai_max_tokens: int = int(os.getenv("OPENAI_MAX_TOKENS", "150"))
     openai_temperature: float = float(os.getenv("OPENAI_TEMPERATURE", "0.1"))
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
     
 
     cache_ttl: int = int(os.getenv("CACHE_TTL", "3600"))
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+    answer_cache_size: int = int(os.getenv("ANSWER_CACHE_SIZE", "4096"))
+    semantic_cache_size: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
     max_query_length: int = int(os.getenv("MAX_QUERY_LENGTH", "1000"))
     rate_limit_per_minute: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
 
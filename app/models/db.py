@@ -1,22 +1,33 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import create_engine, Column, Computed, UniqueConstraint, Integer, String, Text, DateTime, Float, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 from app.core.settings import settings  # Import your settings
 
 
-engine = create_engine(settings.database_url)
+engine = create_engine(
+    settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_pre_ping=True
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class FAQEntry(Base):
     __tablename__ = "faq_entries"
+    __table_args__ = (
+        # Keyed on the fixed-size hash: a btree over unbounded question text
+        # would reject questions past the index row size limit.
+        UniqueConstraint("collection", "question_hash", name="uq_faq_entries_collection_question_hash"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    embedding = Column(Vector(1536), nullable=True)
+    question_hash = Column(LargeBinary, Computed("digest(lower(trim(question)), 'sha256')", persisted=True))
+    embedding = Column(HALFVEC(1536), nullable=True)  # L2-normalized, see normalize_embedding
     collection = Column(String(50), default="default")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -32,6 +43,14 @@ class QueryLog(Base):
     similarity_score = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+    
+    model = Column(String(100), primary_key=True)
+    content_hash = Column(LargeBinary, primary_key=True)  # sha256 of the question text
+    embedding = Column(HALFVEC(1536), nullable=False)  # L2-normalized, like faq_entries.embedding
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
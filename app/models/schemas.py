@@ -1,16 +1,43 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+import unicodedata
+from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, Optional, List
 from datetime import datetime
 
+def _canonical_question(v):
+    # Canonical form so equivalent questions share embedding and answer cache keys.
+    if isinstance(v, str):
+        return unicodedata.normalize("NFKC", v).strip().lower()
+    return v
+
 class QuestionRequest(BaseModel):
     user_question: str = Field(..., min_length=1, max_length=1000)
 
+    @field_validator("user_question", mode="before")
+    @classmethod
+    def normalize_question(cls, v):
+        return _canonical_question(v)
+
+class BatchQuestionRequest(BaseModel):
+    user_questions: List[Annotated[str, Field(min_length=1, max_length=1000)]] = Field(
+        ..., min_length=1, max_length=64
+    )
+
+    @field_validator("user_questions", mode="before")
+    @classmethod
+    def normalize_questions(cls, v):
+        if isinstance(v, list):
+            return [_canonical_question(question) for question in v]
+        return v
+
 class QuestionResponse(BaseModel):
     source: str
     matched_question: Optional[str] = None
     answer: str
     similarity_score: Optional[float] = None
 
+class BatchQuestionResponse(BaseModel):
+    results: List[QuestionResponse]
+
 class FAQEntryCreate(BaseModel):
     question: str
     answer: str
@@ -26,6 +53,10 @@ class FAQEntryResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class FAQEntryPage(BaseModel):
+    items: List[FAQEntryResponse]
+    next_after_id: Optional[int] = None
+
 class EmbeddingStats(BaseModel):
     total_entries: int
     collections: List[str]
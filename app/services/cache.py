@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(text: str) -> str:
+    return text.strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Exact-match cache of question embeddings, keyed on the normalized question.
+    An in-process LRU sits in front of Redis, which shares entries across workers.
+    """
+
+    def __init__(self,
+                 maxsize: int = settings.embedding_cache_size,
+                 ttl: int = settings.cache_ttl,
+                 redis_url: str = settings.redis_url):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._redis = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+
+    def _redis_key(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"faq:embedding:{settings.embedding_model}:{digest}"
+
+    async def get(self, question: str) -> Optional[np.ndarray]:
+        key = normalize_question(question)
+        embedding = self._local.get(key)
+        if embedding is not None:
+            self._local.move_to_end(key)
+            return embedding
+
+        try:
+            raw = await self._redis.get(self._redis_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return None
+
+        if raw is None:
+            return None
+
+        embedding = np.frombuffer(raw, dtype=np.float32)
+        self._remember(key, embedding)
+        return embedding
+
+    async def set(self, question: str, embedding: List[float]) -> np.ndarray:
+        key = normalize_question(question)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, embedding)
+
+        try:
+            await self._redis.set(self._redis_key(key), embedding.tobytes(), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache store failed: {e}")
+
+        return embedding
+
+    async def get_many(self, questions: List[str]) -> List[Optional[np.ndarray]]:
+        """Like get(), with every local miss fetched from Redis in a single MGET."""
+        keys = [normalize_question(question) for question in questions]
+        embeddings = [self._local.get(key) for key in keys]
+        for key, embedding in zip(keys, embeddings):
+            if embedding is not None:
+                self._local.move_to_end(key)
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        try:
+            raws = await self._redis.mget([self._redis_key(keys[i]) for i in missing])
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return embeddings
+
+        for i, raw in zip(missing, raws):
+            if raw is not None:
+                embeddings[i] = np.frombuffer(raw, dtype=np.float32)
+                self._remember(keys[i], embeddings[i])
+        return embeddings
+
+    async def set_many(self, questions: List[str], embeddings: List[List[float]]) -> List[np.ndarray]:
+        """Like set(), with all Redis writes sent in one pipeline."""
+        keys = [normalize_question(question) for question in questions]
+        embeddings = [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+
+        pipe = self._redis.pipeline(transaction=False)
+        for key, embedding in zip(keys, embeddings):
+            self._remember(key, embedding)
+            pipe.set(self._redis_key(key), embedding.tobytes(), ex=self.ttl)
+
+        try:
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache store failed: {e}")
+
+        return embeddings
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._local[key] = embedding
+        self._local.move_to_end(key)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+class AnswerCache:
+    """
+    Exact-question LRU of final /ask responses, keyed on the normalized
+    question, with entries expiring after `ttl` seconds. Paraphrases miss
+    here and are caught by SimilarityService's per-collection ProximityCache.
+    """
+
+    def __init__(self,
+                 maxsize: int = settings.answer_cache_size,
+                 ttl: int = settings.cache_ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, question: str) -> Optional[Any]:
+        key = normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires >= time.time():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+            del self._entries[key]
+            self._evictions += 1
+
+        self._misses += 1
+        return None
+
+    def set(self, question: str, value: Any):
+        key = normalize_question(question)
+        self._entries[key] = (value, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> AnswerCache:
+    return AnswerCache()
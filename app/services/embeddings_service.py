@@ -1,8 +1,13 @@
 import asyncio
+import hashlib
 import numpy as np
-from typing import List, Optional
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
 from langchain_openai import OpenAIEmbeddings
-from app.models.db import FAQEntry
+from celery.signals import worker_process_init
+from sqlalchemy import select, text as sql_text
+from sqlalchemy.dialects.postgresql import insert
+from app.models.db import FAQEntry, EmbeddingCacheEntry
 from app.core.settings import settings
 from app.core.celery_app import celery_app
 import logging
@@ -12,10 +17,41 @@ import openai
 
 logger = logging.getLogger(__name__)
 
+# Texts sent per embeddings request; the API accepts up to 2048 inputs per call.
+EMBEDDING_BATCH_SIZE = 512
+# Share of the TPM limit a single batch request may use.
+EMBEDDING_BATCH_TPM_SHARE = 0.9
+# Batch requests allowed in flight at once.
+EMBEDDING_BATCH_CONCURRENCY = 8
+# Pending rows fetched from the database at a time when embedding a collection.
+COLLECTION_CHUNK_SIZE = 500
+
+def normalize_embedding(embedding: List[float]) -> np.ndarray:
+    """
+    L2-normalize an embedding and round it to float16, matching the
+    halfvec column it is stored in.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.astype(np.float16)
+
+@lru_cache(maxsize=None)
+def _halfvec_literal_format(dimensions: int) -> str:
+    # Five significant digits round-trip every float16 value exactly.
+    return '[' + ','.join(['%.5g'] * dimensions) + ']'
+
+
+def to_halfvec_literal(embedding) -> str:
+    """Format an embedding as a pgvector text literal at float16 precision."""
+    values = np.asarray(embedding, dtype=np.float16).tolist()
+    return _halfvec_literal_format(len(values)) % tuple(values)
+
 class EmbeddingService:
     def __init__(self):
         self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
+            model=settings.embedding_model,
             openai_api_key=settings.openai_api_key
         )
         
@@ -26,42 +62,35 @@ class EmbeddingService:
         """
         return max(1, len(text) // 4)
     
-    async def compute_embedding(self, text: str) -> List[float]:
+    async def compute_embedding(self, text: str) -> np.ndarray:
         try:
             estimated_tokens = self.estimate_tokens(text)
             await openai_rate_limiter.acquire(estimated_tokens)
             embedding = await self.embeddings.aembed_query(text)
-            return embedding
+            return normalize_embedding(embedding)
         except Exception as e:
             logger.error(f"Error computing embedding: {e}")
             raise
         
     async def _compute_embeddings_individually(self, texts: List[str]) -> List[List[float]]:
 
-        embeddings = []        
-        for i, text in enumerate(texts):
-            try:
+        # openai_rate_limiter paces the calls; the semaphore only bounds how many are in flight.
+        semaphore = asyncio.Semaphore(max(1, openai_rate_limiter.rpm_limit // 2))
+
+        async def compute(i: int, text: str) -> List[float]:
+            async with semaphore:
                 logger.info(f"Computing embedding {i+1}/{len(texts)}: {text[:30]}...")
-                embedding = await self.compute_embedding(text)
-                embeddings.append(embedding)
-           
-                if i < len(texts) - 1:
-                    status = openai_rate_limiter.get_status()
-                    rpm_usage = status['rpm']['current'] / status['rpm']['limit']
-                    
-                    if rpm_usage > 0.8: 
-                        delay = 2.0  
-                    elif rpm_usage > 0.6: 
-                        delay = 1.5
-                    else:  
-                        delay = 1.0
-                    
-                    logger.debug(f"Rate limit usage: {rpm_usage:.2f}, using {delay}s delay")
-                    await asyncio.sleep(delay)
-                    
-            except Exception as e:
-                logger.error(f"Failed to compute embedding for text {i+1}: {e}")
-                raise
+                return await self.compute_embedding(text)
+
+        embeddings = await asyncio.gather(
+            *(compute(i, text) for i, text in enumerate(texts)),
+            return_exceptions=True
+        )
+        
+        for i, embedding in enumerate(embeddings):
+            if isinstance(embedding, Exception):
+                logger.error(f"Failed to compute embedding for text {i+1}: {embedding}")
+                raise embedding
         
         return embeddings
 
@@ -92,27 +121,43 @@ class EmbeddingService:
             logger.debug(f"Batch details: {len(texts)} texts, {total_estimated_tokens} estimated tokens")
             raise
     
+    def _split_into_batches(self, texts: List[str]) -> Iterator[Tuple[List[str], int]]:
+        """
+        Yield (texts, estimated_tokens) batches bounded by EMBEDDING_BATCH_SIZE
+        and by EMBEDDING_BATCH_TPM_SHARE of the tokens-per-minute limit.
+        """
+        max_tokens = int(openai_rate_limiter.tpm_limit * EMBEDDING_BATCH_TPM_SHARE)
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = self.estimate_tokens(text)
+            if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or batch_tokens + tokens > max_tokens):
+                yield batch, batch_tokens
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch, batch_tokens
+
     async def compute_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
 
-        try:
-            total_estimated_tokens = sum(self.estimate_tokens(text) for text in texts)
-            
-            status = openai_rate_limiter.get_status()
-            
-            if (status['rpm']['remaining'] > 0 and 
-                status['tpm']['remaining'] > total_estimated_tokens and
-                len(texts) <= 10): 
-                
+        # openai_rate_limiter still paces the requests; the semaphore only bounds how many are in flight.
+        semaphore = asyncio.Semaphore(EMBEDDING_BATCH_CONCURRENCY)
+
+        async def compute(batch: List[str], batch_tokens: int) -> List[List[float]]:
+            async with semaphore:
                 try:
-                    return await self._compute_embeddings_batch_request(texts, total_estimated_tokens)
-                except (openai.RateLimitError, Exception) as e:
+                    return await self._compute_embeddings_batch_request(batch, batch_tokens)
+                except Exception as e:
                     logger.warning(f"Batch request failed: {e}. Falling back to individual requests.")
-            
-           
-            logger.info(f"Using individual requests for {len(texts)} texts to respect rate limits")
-            return await self._compute_embeddings_individually(texts)
+                    return await self._compute_embeddings_individually(batch)
+
+        try:
+            batches = await asyncio.gather(
+                *(compute(batch, batch_tokens) for batch, batch_tokens in self._split_into_batches(texts))
+            )
+            return [embedding for batch in batches for embedding in batch]
         except Exception as e:
             logger.error(f"Error computing batch embeddings: {e}")
             raise
@@ -171,30 +216,116 @@ class EmbeddingService:
                 "message": str(e),
                 "rate_limit_status": openai_rate_limiter.get_status()
             }
-   
+
+
+@lru_cache(maxsize=None)
+def get_embedding_service() -> EmbeddingService:
+    return EmbeddingService()
+
+# Event loop shared by every task run in a worker process, so the cached
+# EmbeddingService keeps its HTTP connection pool between tasks.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+@worker_process_init.connect
+def _init_worker_loop(**kwargs):
+    global _worker_loop
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+def run_in_worker_loop(coro):
+    if _worker_loop is None or _worker_loop.is_closed():
+        _init_worker_loop()
+    return _worker_loop.run_until_complete(coro)
+
+_STORE_EMBEDDINGS_SQL = sql_text("""
+    UPDATE faq_entries
+    SET embedding = CAST(data.embedding AS halfvec(1536)),
+        updated_at = now()
+    FROM unnest(CAST(:ids AS integer[]), CAST(:embeddings AS text[])) AS data(id, embedding)
+    WHERE faq_entries.id = data.id
+""")
+
+def store_embeddings(db, entry_ids: List[int], embeddings: List[List[float]]):
+    """Write embeddings for the given FAQ entries in a single UPDATE statement."""
+    if not entry_ids:
+        return
+    db.execute(_STORE_EMBEDDINGS_SQL, {
+        "ids": list(entry_ids),
+        "embeddings": [to_halfvec_literal(normalize_embedding(embedding)) for embedding in embeddings]
+    })
+
+async def compute_embeddings_memoized(db, questions: List[str]) -> List[np.ndarray]:
+    """
+    Embed `questions`, reusing vectors stored in the embedding_cache table.
+    Each distinct question that is not cached yet is sent to OpenAI once.
+    """
+    hashes = [hashlib.sha256(question.encode("utf-8")).digest() for question in questions]
+    
+    cached = {}
+    if hashes:
+        rows = db.execute(
+            select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                EmbeddingCacheEntry.model == settings.embedding_model,
+                EmbeddingCacheEntry.content_hash.in_(set(hashes))
+            )
+        )
+        cached = {row.content_hash: np.asarray(row.embedding, dtype=np.float16) for row in rows}
+    
+    # One entry per distinct missing question, in first-seen order.
+    missing = {}
+    for question, content_hash in zip(questions, hashes):
+        if content_hash not in cached:
+            missing.setdefault(content_hash, question)
+    
+    if missing:
+        logger.info(f"Embedding cache: {len(questions) - len(missing)} hits, {len(missing)} to compute")
+        computed = await get_embedding_service().compute_embeddings_batch(list(missing.values()))
+        computed = [normalize_embedding(embedding) for embedding in computed]
+        db.execute(
+            insert(EmbeddingCacheEntry).values([
+                {"model": settings.embedding_model, "content_hash": content_hash, "embedding": embedding}
+                for content_hash, embedding in zip(missing, computed)
+            ]).on_conflict_do_nothing()
+        )
+        cached.update(zip(missing, computed))
+    
+    return [cached[content_hash] for content_hash in hashes]
+
 @celery_app.task
 def compute_embeddings_for_collection(collection: str = "default"):
     
     db = SessionLocal()
     try:
-        entries = db.query(FAQEntry).filter(
-            FAQEntry.collection == collection,
-            FAQEntry.embedding.is_(None)
-        ).all()
+        processed = 0
+        last_id = 0
         
-        if not entries:
+        # Walk the pending rows in keyset chunks and commit each one, so a
+        # redelivered task only pays for entries that are still missing an
+        # embedding. Rows locked by another worker are skipped.
+        while True:
+            chunk = db.execute(
+                select(FAQEntry.id, FAQEntry.question).where(
+                    FAQEntry.collection == collection,
+                    FAQEntry.embedding.is_(None),
+                    FAQEntry.id > last_id
+                ).order_by(FAQEntry.id).limit(COLLECTION_CHUNK_SIZE).with_for_update(skip_locked=True)
+            ).all()
+            if not chunk:
+                break
+            
+            questions = [entry.question for entry in chunk]
+            embeddings = run_in_worker_loop(compute_embeddings_memoized(db, questions))
+            store_embeddings(db, [entry.id for entry in chunk], embeddings)
+            db.commit()
+            
+            processed += len(chunk)
+            last_id = chunk[-1].id
+        
+        if not processed:
             logger.info(f"No entries to process for collection: {collection}")
             return
         
-        embedding_service = EmbeddingService()
-        questions = [entry.question for entry in entries]
-   
-        embeddings = asyncio.run(embedding_service.compute_embeddings_batch(questions))
-        for entry, embedding in zip(entries, embeddings):
-            entry.embedding = embedding
-        
-        db.commit()
-        logger.info(f"Computed embeddings for {len(entries)} entries in collection: {collection}")
+        logger.info(f"Computed embeddings for {processed} entries in collection: {collection}")
         
     except Exception as e:
         logger.error(f"Error computing embeddings for collection {collection}: {e}")
@@ -207,19 +338,19 @@ def compute_embeddings_for_collection(collection: str = "default"):
 def update_embeddings_incremental(entry_ids: List[int]):
     db = SessionLocal()
     try:
-        entries = db.query(FAQEntry).filter(FAQEntry.id.in_(entry_ids)).all()
+        entries = db.query(FAQEntry.id, FAQEntry.question).filter(
+            FAQEntry.id.in_(entry_ids),
+            FAQEntry.embedding.is_(None)
+        ).with_for_update(skip_locked=True).all()
         
         if not entries:
             logger.info("No entries to update")
             return
         
-        embedding_service = EmbeddingService()
         questions = [entry.question for entry in entries]
         
-        embeddings = asyncio.run(embedding_service.compute_embeddings_batch(questions))
-        
-        for entry, embedding in zip(entries, embeddings):
-            entry.embedding = embedding
+        embeddings = run_in_worker_loop(compute_embeddings_memoized(db, questions))
+        store_embeddings(db, [entry.id for entry in entries], embeddings)
         
         db.commit()
         logger.info(f"Updated embeddings for {len(entries)} entries")
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Optional
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
@@ -6,6 +7,9 @@ import logging
 from app.core.celery_app import celery_app
 logger = logging.getLogger(__name__)
 
+# Returned when the LLM call fails; never worth caching.
+UNAVAILABLE_ANSWER = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+
 class OpenAIService:
     def __init__(self):
         self.llm = ChatOpenAI(
@@ -13,28 +17,34 @@ class OpenAIService:
             openai_api_key=settings.openai_api_key,
             temperature=0.7
         )
-        
-    async def get_answer(self, user_question: str, context: Optional[str] = None) -> str:
-        
-        if not user_question or user_question.strip() == "":
-            return "Please provide a valid question."
-        try:
-            system_message = SystemMessage(content="""
+        # Built once: the prompt never changes, and an identical leading
+        # message keeps the request prefix stable for OpenAI's prompt caching.
+        self._system_message = SystemMessage(content="""
             You are a helpful IT support assistant. Answer user questions about account management, 
             password resets, profile settings, and general IT support topics. Answer only if you know the answer, don't guess.
             Be concise and provide actionable steps when possible.
             If you don't know the answer or the question is not related to IT support, politely redirect the user with 
             "This is not really what I was trained for, therefore I cannot answer. Try again! ".
             """)
-            
+        
+    async def get_answer(self, user_question: str, context: Optional[str] = None) -> str:
+        
+        if not user_question or user_question.strip() == "":
+            return "Please provide a valid question."
+        try:
             human_message = HumanMessage(content=user_question)
             
             if context:
                 human_message.content = f"Context: {context}\n\nQuestion: {user_question}"
             
-            response = await self.llm.ainvoke([system_message, human_message])
+            response = await self.llm.ainvoke([self._system_message, human_message])
             return response.content
             
         except Exception as e:
             logger.error(f"Error getting OpenAI response: {e}")
-            return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
\ No newline at end of file
+            return UNAVAILABLE_ANSWER
+
+
+@lru_cache(maxsize=None)
+def get_openai_service() -> OpenAIService:
+    return OpenAIService()
@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProximityCache:
+    """
+    Bounded LRU of (query embedding -> result) that answers a lookup when the
+    incoming embedding has a cosine similarity of at least `threshold` with a
+    cached key. Keys are stored L2-normalized in one matrix, so a lookup is a
+    single matrix-vector product over the cached entries.
+    """
+
+    def __init__(self,
+                 capacity: int = settings.semantic_cache_size,
+                 threshold: float = settings.semantic_cache_threshold,
+                 ttl: int = settings.cache_ttl):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._keys: Optional[np.ndarray] = None
+        self._values: List[Any] = [None] * capacity
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def lookup(self, embedding) -> Optional[Any]:
+        if not self._size:
+            self.misses += 1
+            return None
+
+        sims = self._keys[:self._size] @ self._normalize(embedding)
+        sims[self._expires[:self._size] < time.time()] = -1.0
+        best = int(np.argmax(sims))
+
+        if sims[best] >= self.threshold:
+            logger.debug(f"Proximity cache hit with similarity {sims[best]:.4f}")
+            self._touch(best)
+            self.hits += 1
+            return self._values[best]
+        self.misses += 1
+        return None
+
+    def insert(self, embedding, value: Any):
+        vector = self._normalize(embedding)
+        if self._keys is None:
+            self._keys = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+            self.evictions += 1
+
+        self._keys[slot] = vector
+        self._values[slot] = value
+        self._expires[slot] = time.time() + self.ttl
+        self._touch(slot)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self._size,
+        }
@@ -1,9 +1,13 @@
 import numpy as np
-from typing import List, Tuple, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional
+import asyncpg
 from app.models.db import FAQEntry
-from app.services.embeddings_service import EmbeddingService
+from app.services.embeddings_service import get_embedding_service, normalize_embedding, to_halfvec_literal
+from app.services.cache import EmbeddingCache
+from app.services.proximity_cache import ProximityCache
+from app.core.db_pool import acquire_connection
 from app.core.settings import settings
 import logging
 from pgvector.sqlalchemy import Vector
@@ -12,60 +16,191 @@ from pgvector.sqlalchemy import Vector
 logger = logging.getLogger(__name__)
 
 class SimilarityService:
+    # asyncpg's per-connection statement cache is keyed on the query text, so
+    # these fixed strings are parsed once per pooled connection by fetch/fetchrow.
+
+    # Matches question_hash, the generated column on faq_entries.
+    _EXACT_MATCH_SQL = """
+        SELECT id, question, answer
+        FROM faq_entries
+        WHERE question_hash = digest(lower(trim($1)), 'sha256')
+          AND collection = $2
+        LIMIT 1
+    """
+
+    # Stored and query embeddings are both unit length, so the inner product
+    # equals the cosine similarity. <#> returns its negation; it is computed
+    # once per row in an inner query and the outer query only flips the sign.
+    _NEAREST_SQL = """
+        SELECT id, question, answer, -distance AS similarity_score
+        FROM (
+            SELECT id, question, answer,
+                   embedding <#> CAST($1 AS halfvec(1536)) AS distance
+            FROM faq_entries
+            WHERE collection = $2
+              AND embedding IS NOT NULL
+            ORDER BY embedding <#> CAST($1 AS halfvec(1536))
+            LIMIT $3
+        ) nearest
+    """
+
+    _BINARY_RERANK_SQL = """
+        SELECT id, question, answer, -distance AS similarity_score
+        FROM (
+            SELECT id, question, answer,
+                   embedding <#> CAST($1 AS halfvec(1536)) AS distance
+            FROM (
+                SELECT id, question, answer, embedding
+                FROM faq_entries
+                WHERE collection = $2
+                  AND embedding IS NOT NULL
+                ORDER BY binary_quantize(embedding)::bit(1536)
+                         <~> binary_quantize(CAST($1 AS halfvec(1536)))
+                LIMIT $4
+            ) candidates
+        ) scored
+        ORDER BY distance
+        LIMIT $3
+    """
+
+    # Batched forms of the statements above: one search per question in a
+    # single statement, with WITH ORDINALITY tying each row to its question.
+    _BATCH_EXACT_MATCH_SQL = """
+        SELECT q.idx, f.id, f.question, f.answer
+        FROM unnest($1::text[]) WITH ORDINALITY AS q(question, idx)
+        CROSS JOIN LATERAL (
+            SELECT id, question, answer
+            FROM faq_entries
+            WHERE question_hash = digest(lower(trim(q.question)), 'sha256')
+              AND collection = $2
+            LIMIT 1
+        ) f
+    """
+
+    _BATCH_NEAREST_SQL = """
+        WITH queries AS (
+            SELECT CAST(literal AS halfvec(1536)) AS embedding, idx
+            FROM unnest($1::text[]) WITH ORDINALITY AS q(literal, idx)
+        )
+        SELECT q.idx, f.id, f.question, f.answer, -f.distance AS similarity_score
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT id, question, answer, embedding <#> q.embedding AS distance
+            FROM faq_entries
+            WHERE collection = $2
+              AND embedding IS NOT NULL
+            ORDER BY embedding <#> q.embedding
+            LIMIT 1
+        ) f
+    """
+
+    _BATCH_BINARY_RERANK_SQL = """
+        WITH queries AS (
+            SELECT CAST(literal AS halfvec(1536)) AS embedding, idx
+            FROM unnest($1::text[]) WITH ORDINALITY AS q(literal, idx)
+        )
+        SELECT q.idx, f.id, f.question, f.answer, -f.distance AS similarity_score
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT id, question, answer, embedding <#> q.embedding AS distance
+            FROM (
+                SELECT id, question, answer, embedding
+                FROM faq_entries
+                WHERE collection = $2
+                  AND embedding IS NOT NULL
+                ORDER BY binary_quantize(embedding)::bit(1536)
+                         <~> binary_quantize(q.embedding)
+                LIMIT $3
+            ) candidates
+            ORDER BY distance
+            LIMIT 1
+        ) f
+    """
+
+    # A generic plan cannot match the per-collection partial HNSW indexes,
+    # so the prepared statement is always planned for the bound collection.
+    _SET_SEARCH_CONFIG_SQL = """
+        SELECT set_config('hnsw.ef_search', $1, true),
+               set_config('plan_cache_mode', 'force_custom_plan', true)
+    """
+
     def __init__(self):
-        self.embedding_service = EmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.threshold = settings.similarity_threshold
+        self.embedding_cache = EmbeddingCache()
+        self.proximity_caches: Dict[str, ProximityCache] = defaultdict(ProximityCache)
+        self.rerank_candidates = settings.binary_rerank_candidates
+        self._stmt_sql = self._BINARY_RERANK_SQL if self.rerank_candidates > 0 else self._NEAREST_SQL
+        self._batch_stmt_sql = self._BATCH_BINARY_RERANK_SQL if self.rerank_candidates > 0 else self._BATCH_NEAREST_SQL
     
     
     async def find_most_similar(
         self, 
         user_question: str, 
-        db: Session, 
+        pool: asyncpg.Pool, 
         collection: str = "default",
         limit: int = 1
     ) -> Optional[Tuple[FAQEntry, float]]:
 
         try:
 
-            user_embedding = await self.embedding_service.compute_embedding(user_question)
-            user_embedding = '[' + ','.join(map(str, user_embedding)) + ']'
-            query = text("""
-                    SELECT id, question, answer, collection, created_at, updated_at,
-                           1 - (embedding <=> :user_embedding) AS similarity_score
-                    FROM faq_entries
-                    WHERE collection = :collection
-                      AND embedding IS NOT NULL
-                    ORDER BY embedding <=> :user_embedding
-                    LIMIT :limit
-                """)
-                
-            
-            result = db.execute(query, {
-                "user_embedding": user_embedding,
-                "collection": collection,
-                "limit": limit
-            })
-            
-            rows = result.fetchall()
-            
-            if not rows:
+            # A question that is word for word in the FAQ needs neither an
+            # embedding nor an HNSW scan.
+            # Connections are only held around the SQL, never across the
+            # embedding request.
+            async with acquire_connection(pool) as conn:
+                exact_match = await conn.fetchrow(self._EXACT_MATCH_SQL, user_question, collection)
+            if exact_match is not None:
+                faq_entry = FAQEntry(
+                    id=exact_match["id"],
+                    question=exact_match["question"],
+                    answer=exact_match["answer"],
+                    collection=collection
+                )
+                return faq_entry, 1.0
+
+            user_embedding = await self.embedding_cache.get(user_question)
+            if user_embedding is None:
+                user_embedding = await self.embedding_service.compute_embedding(user_question)
+                user_embedding = await self.embedding_cache.set(user_question, user_embedding)
+
+            proximity_cache = self.proximity_caches[collection]
+            cached_match = proximity_cache.lookup(user_embedding)
+            if cached_match is not None:
+                return cached_match
+
+            # The pool's halfvec codec sends the array in binary, so there is
+            # no text literal to build here or to parse on the server.
+            params = [user_embedding, collection, limit]
+            if self.rerank_candidates > 0:
+                params.append(self.rerank_candidates)
+
+            # hnsw.ef_search also caps how many rows an HNSW scan can return.
+            # set_config(..., true) only lasts for the transaction, so the
+            # pooled connection goes back untouched.
+            ef_search = max(settings.hnsw_ef_search, self.rerank_candidates)
+            async with acquire_connection(pool) as conn, conn.transaction():
+                await conn.execute(self._SET_SEARCH_CONFIG_SQL, str(ef_search))
+                # fetchrow goes through asyncpg's per-connection statement cache,
+                # so after the first call on a pooled connection only bind/execute
+                # remain. Connection.prepare() would bypass that cache.
+                best_match = await conn.fetchrow(self._stmt_sql, *params)
+
+            if best_match is None:
                 logger.warning(f"No FAQ entries found for collection: {collection}")
                 return None
+
+            similarity_score = best_match["similarity_score"]
             
-  
-            best_match = rows[0]
-            similarity_score = best_match.similarity_score
-            
-            logger.info(f"Best match found: {best_match.question} with score {similarity_score}")   
+            logger.info(f"Best match found: {best_match['question']} with score {similarity_score}")   
             if similarity_score >= self.threshold:
                 faq_entry = FAQEntry(
-                    id=best_match.id,
-                    question=best_match.question,
-                    answer=best_match.answer,
-                    collection=best_match.collection,
-                    created_at=best_match.created_at,
-                    updated_at=best_match.updated_at
+                    id=best_match["id"],
+                    question=best_match["question"],
+                    answer=best_match["answer"],
+                    collection=collection
                 )
+                proximity_cache.insert(user_embedding, (faq_entry, similarity_score))
                 return faq_entry, similarity_score
             else:
                 logger.info(f"Best similarity score {similarity_score} below threshold {self.threshold}")
@@ -74,4 +209,92 @@ class SimilarityService:
         except Exception as e:
             logger.error(f"Error finding similar question: {e}")
             raise
-    
+
+
+    async def find_most_similar_batch(
+        self,
+        user_questions: List[str],
+        pool: asyncpg.Pool,
+        collection: str = "default"
+    ) -> List[Optional[Tuple[FAQEntry, float]]]:
+        """
+        Batched find_most_similar, going through the same layers: the
+        question_hash lookup, the semantic cache and the ANN query.
+        Each layer costs at most one round trip for the whole batch, and a
+        question repeated in the batch is only looked up once.
+        """
+        try:
+            proximity_cache = self.proximity_caches[collection]
+            matches: Dict[str, Optional[Tuple[FAQEntry, float]]] = {}
+
+            pending = list(dict.fromkeys(user_questions))
+            if pending:
+                async with acquire_connection(pool) as conn:
+                    rows = await conn.fetch(self._BATCH_EXACT_MATCH_SQL, pending, collection)
+                for row in rows:
+                    question = pending[row["idx"] - 1]
+                    faq_entry = FAQEntry(
+                        id=row["id"],
+                        question=row["question"],
+                        answer=row["answer"],
+                        collection=collection
+                    )
+                    matches[question] = faq_entry, 1.0
+                pending = [question for question in pending if question not in matches]
+
+            if not pending:
+                return [matches.get(question) for question in user_questions]
+
+            embeddings = dict(zip(pending, await self.embedding_cache.get_many(pending)))
+            to_compute = [question for question in pending if embeddings[question] is None]
+            if to_compute:
+                computed = await self.embedding_service.compute_embeddings_batch(to_compute)
+                computed = await self.embedding_cache.set_many(
+                    to_compute, [normalize_embedding(embedding) for embedding in computed]
+                )
+                embeddings.update(zip(to_compute, computed))
+
+            to_search = []
+            for question in pending:
+                cached_match = proximity_cache.lookup(embeddings[question])
+                if cached_match is not None:
+                    matches[question] = cached_match
+                else:
+                    to_search.append(question)
+
+            if to_search:
+                params = [[to_halfvec_literal(embeddings[question]) for question in to_search], collection]
+                if self.rerank_candidates > 0:
+                    params.append(self.rerank_candidates)
+
+                ef_search = max(settings.hnsw_ef_search, self.rerank_candidates)
+                async with acquire_connection(pool) as conn, conn.transaction():
+                    await conn.execute(self._SET_SEARCH_CONFIG_SQL, str(ef_search))
+                    rows = await conn.fetch(self._batch_stmt_sql, *params)
+
+                for row in rows:
+                    question = to_search[row["idx"] - 1]
+                    similarity_score = row["similarity_score"]
+                    if similarity_score >= self.threshold:
+                        faq_entry = FAQEntry(
+                            id=row["id"],
+                            question=row["question"],
+                            answer=row["answer"],
+                            collection=collection
+                        )
+                        matches[question] = faq_entry, similarity_score
+                        proximity_cache.insert(embeddings[question], matches[question])
+
+            return [matches.get(question) for question in user_questions]
+
+        except Exception as e:
+            logger.error(f"Error finding similar questions for batch: {e}")
+            raise
+
+    def get_cache_stats(self) -> Dict[str, dict]:
+        return {collection: cache.stats() for collection, cache in self.proximity_caches.items()}
+
+
+@lru_cache(maxsize=None)
+def get_similarity_service() -> SimilarityService:
+    return SimilarityService()
@@ -4,4 +4,5 @@ DO $$
 BEGIN
     RAISE NOTICE 'PostgreSQL extensions enabled successfully!';
     RAISE NOTICE 'Run init.py to complete the database initialization with embeddings.';
-END $$;
\ No newline at end of file
+END $$;
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
@@ -1,15 +1,17 @@
 import asyncio
+import csv
+import hashlib
+import io
+import re
 import sys
 import os
 import logging
 
 sys.path.append('/app')
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from app.models.db import Base, FAQEntry
-from app.services.embeddings_service import EmbeddingService
-from app.core.settings import settings
+from sqlalchemy import text
+from app.models.db import Base, FAQEntry, engine, SessionLocal
+from app.services.embeddings_service import compute_embeddings_memoized, store_embeddings
 
 logging.basicConfig(
     level=logging.INFO,
@@ -73,31 +75,97 @@ FAQ_DATA = [
 
 def create_database_extensions():
     try:
-        engine = create_engine(settings.database_url)
         with engine.connect() as conn:
             conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto;"))
             conn.commit()
-            logger.info("Created pgvector extension")
+            logger.info("Created pgvector and pgcrypto extensions")
     except Exception as e:
         logger.error(f"Error creating extensions: {e}")
         raise
 
 def create_database_tables():
     try:
-        engine = create_engine(settings.database_url)
         Base.metadata.create_all(bind=engine)
         logger.info("Created database tables")
+        migrate_embedding_column()
+        migrate_question_hash_column()
+        migrate_question_unique_index()
     except Exception as e:
         logger.error(f"Error creating tables: {e}")
         raise
 
+def migrate_embedding_column():
+    """
+    Convert a faq_entries.embedding column created as vector(1536) to the
+    normalized halfvec(1536) the model now declares.
+    """
+    with engine.connect() as conn:
+        column_type = conn.execute(text("""
+            SELECT format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = 'faq_entries'::regclass AND attname = 'embedding'
+        """)).scalar()
+
+        if not column_type or not column_type.startswith("vector"):
+            return
+
+        # Both indexes use vector operator classes, which halfvec does not support.
+        conn.execute(text("DROP INDEX IF EXISTS idx_faq_entries_embedding;"))
+        conn.execute(text("DROP INDEX IF EXISTS idx_faq_entries_embedding_hnsw;"))
+        conn.execute(text(
+            "ALTER TABLE faq_entries ALTER COLUMN embedding TYPE halfvec(1536) "
+            "USING l2_normalize(embedding)::halfvec(1536);"
+        ))
+        conn.commit()
+        logger.info("Migrated faq_entries.embedding to halfvec(1536)")
+
+def migrate_question_hash_column():
+    """Add the generated faq_entries.question_hash column to tables created before it."""
+    with engine.connect() as conn:
+        conn.execute(text(
+            "ALTER TABLE faq_entries ADD COLUMN IF NOT EXISTS question_hash BYTEA "
+            "GENERATED ALWAYS AS (digest(lower(trim(question)), 'sha256')) STORED;"
+        ))
+        conn.commit()
+
+def migrate_question_unique_index():
+    """
+    Back the (collection, question_hash) unique constraint on tables created
+    before it. Existing rows that repeat a question within a collection would
+    block the index; they are reported for an operator to resolve, never
+    deleted here.
+    """
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS uq_faq_entries_question_collection;"))
+
+        duplicates = conn.execute(text("""
+            SELECT collection, array_agg(id ORDER BY id) AS ids
+            FROM faq_entries
+            WHERE collection IS NOT NULL
+            GROUP BY collection, question_hash
+            HAVING count(*) > 1;
+        """)).all()
+        if duplicates:
+            details = "; ".join(f"collection {row.collection!r}: ids {row.ids}" for row in duplicates)
+            raise RuntimeError(
+                "Cannot create uq_faq_entries_collection_question_hash: faq_entries has "
+                f"questions repeated within a collection ({details}). "
+                "Merge or delete the duplicates, then re-run init."
+            )
+
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_faq_entries_collection_question_hash "
+            "ON faq_entries(collection, question_hash);"
+        ))
+        conn.commit()
+
 def create_database_indexes():
     try:
-        engine = create_engine(settings.database_url)
         with engine.connect() as conn:
             indexes = [
                 "CREATE INDEX IF NOT EXISTS idx_faq_entries_collection ON faq_entries(collection);",
-                "CREATE INDEX IF NOT EXISTS idx_faq_entries_embedding ON faq_entries USING ivfflat (embedding vector_cosine_ops);",
+                "CREATE INDEX IF NOT EXISTS idx_faq_entries_question_hash ON faq_entries USING hash (question_hash);",
                 "CREATE INDEX IF NOT EXISTS idx_query_logs_created_at ON query_logs(created_at);",
                 "CREATE INDEX IF NOT EXISTS idx_query_logs_source ON query_logs(source);"
             ]
@@ -111,47 +179,119 @@ def create_database_indexes():
         logger.error(f"Error creating indexes: {e}")
         raise
 
+def configure_hnsw_params(vector_count: int) -> dict:
+    """
+    HNSW build and search parameters for a table of `vector_count` vectors.
+    Larger graphs need more links per node to keep recall at the same ef_search.
+    """
+    if vector_count > 100_000:
+        return {"m": 24, "ef_construction": 128, "ef_search": 100}
+    return {"m": 16, "ef_construction": 64, "ef_search": 100}
+
+def collection_index_name(collection: str, prefix: str = "idx_faq_entries_embedding_ip_hnsw") -> str:
+    """Name of a partial index for `collection`, safe to use unquoted."""
+    slug = re.sub(r"[^a-z0-9]+", "_", collection.lower()).strip("_")[:20]
+    digest = hashlib.md5(collection.encode("utf-8")).hexdigest()[:8]
+    return f"{prefix}_{slug}_{digest}"
+
+def create_embedding_indexes(hnsw_params: dict):
+    try:
+        with engine.connect() as conn:
+            # Let pgvector build the graph in memory with parallel workers. SET LOCAL
+            # keeps these from leaking to the pooled connection after the commit.
+            conn.execute(text("SET LOCAL maintenance_work_mem = '2GB';"))
+            conn.execute(text("SET LOCAL max_parallel_maintenance_workers = 7;"))
+            
+            build_options = f"WITH (m = {hnsw_params['m']}, ef_construction = {hnsw_params['ef_construction']})"
+            indexes = [
+                "DROP INDEX IF EXISTS idx_faq_entries_embedding;",
+                f"CREATE INDEX IF NOT EXISTS idx_faq_entries_embedding_ip_hnsw ON faq_entries USING hnsw (embedding halfvec_ip_ops) {build_options};",
+                f"CREATE INDEX IF NOT EXISTS idx_faq_entries_embedding_bits_hnsw ON faq_entries USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops) {build_options};"
+            ]
+            
+            # The cosine indexes are superseded by the inner-product ones.
+            cosine_indexes = conn.execute(text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename = 'faq_entries' AND indexname LIKE 'idx\\_faq\\_entries\\_embedding\\_hnsw%';"
+            )).scalars().all()
+            indexes = [f"DROP INDEX IF EXISTS {name};" for name in cosine_indexes] + indexes
+            
+            for index_sql in indexes:
+                conn.execute(text(index_sql))
+            
+            # A partial index per collection keeps the traversal inside the
+            # collection being searched, instead of filtering after the scan.
+            # The full index above still serves collections added later.
+            # psycopg2 inlines :collection client-side, as DDL cannot take parameters.
+            collections = conn.execute(text(
+                "SELECT DISTINCT collection FROM faq_entries WHERE collection IS NOT NULL;"
+            )).scalars().all()
+            for collection in collections:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {collection_index_name(collection)} ON faq_entries "
+                    f"USING hnsw (embedding halfvec_ip_ops) {build_options} "
+                    f"WHERE collection = :collection;"
+                ), {"collection": collection})
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {collection_index_name(collection, 'idx_faq_entries_bits_hnsw')} "
+                    f"ON faq_entries USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops) {build_options} "
+                    f"WHERE collection = :collection;"
+                ), {"collection": collection})
+            
+            conn.commit()
+            logger.info(f"Created embedding indexes with {hnsw_params}; "
+                        f"use HNSW_EF_SEARCH={hnsw_params['ef_search']} for queries")
+    except Exception as e:
+        logger.error(f"Error creating embedding indexes: {e}")
+        raise
+
 def insert_faq_data():
+    """
+    Bulk-load FAQ_DATA with COPY into a temporary table, then merge it into
+    faq_entries. Rows whose question (trimmed, case-insensitive) is already in
+    the same collection are skipped, so re-running init is idempotent.
+    Returns the row count.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for faq_item in FAQ_DATA:
+        writer.writerow((faq_item["question"], faq_item["answer"], faq_item["collection"]))
+    buffer.seek(0)
 
+    raw = engine.raw_connection()
     try:
-        engine = create_engine(settings.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        db = SessionLocal()
-        
-     
-        existing_count = db.query(FAQEntry).count()
-        if existing_count > 0:
-            logger.info(f"📋 FAQ data already exists ({existing_count} entries). Skipping insertion.")
-            db.close()
-            return
-        
-        faq_entries = []
-        for faq_item in FAQ_DATA:
-            faq_entry = FAQEntry(
-                question=faq_item["question"],
-                answer=faq_item["answer"],
-                collection=faq_item["collection"]
+        with raw.cursor() as cur:
+            cur.execute(
+                "CREATE TEMP TABLE faq_seed (question TEXT, answer TEXT, collection VARCHAR(50)) "
+                "ON COMMIT DROP;"
             )
-            faq_entries.append(faq_entry)
-        
-        db.add_all(faq_entries)
-        db.commit()
-        
-        logger.info(f"Inserted {len(faq_entries)} FAQ entries")
-        db.close()
-        
+            cur.copy_expert("COPY faq_seed (question, answer, collection) FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute("""
+                INSERT INTO faq_entries (question, answer, collection)
+                SELECT question, answer, collection FROM faq_seed
+                ON CONFLICT (collection, question_hash) DO NOTHING;
+            """)
+            inserted = cur.rowcount
+            cur.execute("SELECT count(*) FROM faq_entries;")
+            total = cur.fetchone()[0]
+        raw.commit()
+
+        logger.info(f"Inserted {inserted} FAQ entries ({total} total)")
+        return total
+
     except Exception as e:
         logger.error(f"Error inserting FAQ data: {e}")
+        raw.rollback()
         raise
+    finally:
+        raw.close()
 
 async def generate_and_store_embeddings():
 
     try:
-        engine = create_engine(settings.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         db = SessionLocal()
         
-        entries_without_embeddings = db.query(FAQEntry).filter(
+        entries_without_embeddings = db.query(FAQEntry.id, FAQEntry.question).filter(
             FAQEntry.embedding.is_(None)
         ).all()
         
@@ -162,17 +302,12 @@ async def generate_and_store_embeddings():
         
         logger.info(f"Generating embeddings for {len(entries_without_embeddings)} entries...")
         
-        embedding_service = EmbeddingService()
         questions = [entry.question for entry in entries_without_embeddings]
         
         logger.info("Computing embeddings using OpenAI API...")
-        embeddings = await embedding_service.compute_embeddings_batch(questions)
-        
-        for entry, embedding in zip(entries_without_embeddings, embeddings):
-            entry.embedding = embedding
-            logger.info(f"Generated embedding for: {entry.question[:60]}...")
+        embeddings = await compute_embeddings_memoized(db, questions)
         
-
+        store_embeddings(db, [entry.id for entry in entries_without_embeddings], embeddings)
         db.commit()
         db.close()
         
@@ -188,8 +323,6 @@ async def generate_and_store_embeddings():
 async def verify_setup():
 
     try:
-        engine = create_engine(settings.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         db = SessionLocal()
 
         total_entries = db.query(FAQEntry).count()
@@ -224,14 +357,19 @@ async def main():
         logger.info("2 Creating database tables...")
         create_database_tables()
         
-        logger.info("3 Creating database indexes...")
-        create_database_indexes()
+        logger.info("3 Inserting FAQ data...")
+        faq_count = insert_faq_data()
         
-        logger.info("4 Inserting FAQ data...")
-        insert_faq_data()
-
-        logger.info("5 Generating embeddings...")
-        await generate_and_store_embeddings()
+        # The plain indexes only need the tables, so build them while the
+        # embeddings are computed; the HNSW indexes wait for the embeddings.
+        logger.info("4 Creating database indexes and generating embeddings...")
+        await asyncio.gather(
+            asyncio.to_thread(create_database_indexes),
+            generate_and_store_embeddings(),
+        )
+        
+        logger.info("5 Creating embedding indexes...")
+        create_embedding_indexes(configure_hnsw_params(faq_count))
         
         logger.info("6 Verifying setup...")
         await verify_setup()
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import endpoints
+from app.core.db_pool import get_db_pool, close_db_pool
 from app.models.db import create_tables
 import logging
 import uvicorn
@@ -10,10 +11,20 @@ from contextlib import asynccontextmanager
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_tables()
+    logger.info("Database tables created")
+    await get_db_pool()
+    yield
+    await close_db_pool()
+
+
 app = FastAPI(
     title="FAQ app",
     description="AI-powered FAQ system with semantic search and OpenAI integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -27,12 +38,6 @@ app.add_middleware(
 app.include_router(endpoints.router, prefix="/api/v1")
 
 
-@asynccontextmanager
-async def startup_event():
-    create_tables()
-    logger.info("Database tables created")
-
-
 @app.get("/")
 async def root():
     return {"message": "FAQ app", "version": "1.0.0"}